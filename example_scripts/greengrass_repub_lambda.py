@@ -6,17 +6,24 @@ Created on Sat May 21 16:07:00 2020
 This is a simple example of a lambda function to be deployed
  to Greengrass core. It accompanies the demonstration at:
  https://github.com/AnHosu/iot_poc/blob/master/greengrass_ml.md
-The lambda function republishes values to the local Shadow service.
+The lambda function republishes values to the local Shadow service through
+ the ShadowProxy in shadow_proxy.py. The lambda should be long-lived, so the
+ proxy can coalesce the updates from many messages into one write per flush
+ interval.
 """
 import greengrasssdk
+from shadow_proxy import ShadowProxy
 import logging
-import json
 import time
 import os
 
 THING_NAME = os.environ["THING_NAME"]
 
 client = greengrasssdk.client('iot-data')
+# This lambda only writes its own readings and never sees documents messages,
+#  so its writes are plain partial updates without a version
+shadow = ShadowProxy(client, flush_interval=10, versioned=False)
+shadow.start()
 
 def get_cpu_temperature():
     '''
@@ -55,14 +62,14 @@ def function_handler(event, context):
         avg_cpu_temp = sum(cpu_temps)/float(len(cpu_temps))
         # Compensated temperature
         comp_temp = 2*input_temperature - avg_cpu_temp
-        message = {}
-        message["state"] = { "reported" : {"temperature" : comp_temp,
-                                            "pressure" : event["pressure"],
-                                            "humidity" : event["humidity"],
-                                            "message" : event["message"]}}
+        reported = {"temperature" : comp_temp,
+                    "pressure" : event["pressure"],
+                    "humidity" : event["humidity"],
+                    "message" : event["message"]}
         logging.info(event)
-        logging.info(message)
+        logging.info(reported)
+        # Queue the update, the proxy writes it on the next flush
+        shadow.update(THING_NAME, reported=reported)
     except Exception as e:
         logging.error(e)
-    client.update_thing_shadow(thingName=THING_NAME, payload=json.dumps(message))
     return
\ No newline at end of file
@@ -20,6 +20,7 @@ from AWSIoTPythonSDK.core.greengrass.discovery.providers import DiscoveryInfoPro
 from AWSIoTPythonSDK.core.protocol.connection.cores import ProgressiveBackOffCore
 from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 from AWSIoTPythonSDK.exception.AWSIoTExceptions import DiscoveryInvalidRequestException
+from publish_scheduler import PublishScheduler, TELEMETRY
 
 ### Setup for my particular sensor
 import bme680
@@ -101,6 +102,10 @@ if not connected:
     print("Cannot connect to core %s. Exiting..." % coreInfo.coreThingArn)
     sys.exit(-2)
 
+# Publish through the scheduler, so readings cannot crowd out other traffic
+scheduler = PublishScheduler(myAWSIoTMQTTClient)
+scheduler.start()
+
 
 loopCount = 0
 while True:
@@ -117,7 +122,7 @@ while True:
         message['humidity'] = None
         message['message'] = "Fail"
     messageJson = json.dumps(message)
-    myAWSIoTMQTTClient.publish(topic, messageJson, 0)
-    print('Published topic %s: %s\n' % (topic, messageJson))
+    scheduler.publish(topic, messageJson, 0, kind=TELEMETRY)
+    print('Queued topic %s: %s\n' % (topic, messageJson))
     loopCount += 1
     time.sleep(10)
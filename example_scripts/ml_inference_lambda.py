@@ -7,29 +7,66 @@ This is a simple example of a ML inference lambda to be deployed
  to Greengrass core. It accompanies the demonstration at:
  https://github.com/AnHosu/iot_poc/blob/master/greengrass_ml.md
 The lambda function should be longlived and allowed access to the
- SavedModel resources.
+ SavedModel resources. Shadow reads and writes go through the ShadowProxy
+ in shadow_proxy.py, which must be included in the deployment package.
+Setting the environment variable MODEL_FORMAT to int8 makes the lambda use
+ the int8 model created with quantise_rain_predictor.py instead. This only
+ needs the TFLite runtime, not the full Tensorflow install.
 """
 import greengrasssdk
-import tensorflow as tf
+from shadow_proxy import ShadowProxy
+import threading
 import json
 import time
 import logging
 import os
 
 THING_NAME = os.environ["THING_NAME"]
+MODEL_FORMAT = os.environ.get("MODEL_FORMAT", "float")
 STANDARDISER_PATH = "/ggml/tensorflow/standardiser"
 MODEL_PATH = "/ggml/tensorflow/rain_predictor"
+INT8_MODEL_PATH = "/ggml/tflite/rain_predictor_int8/rain_predictor_int8.tflite"
+INT8_PARAMS_PATH = "/ggml/tflite/rain_predictor_int8/quantisation.json"
 CLASSIFICATION_THRESHOLD = 0.5
 
-# Load the model that standardises readings
-loaded_standardiser = tf.saved_model.load(STANDARDISER_PATH)
-inference_standardiser = loaded_standardiser.signatures["serving_default"]
+# Fail loudly on a typo rather than falling back to the full Tensorflow install
+if MODEL_FORMAT not in ("float", "int8"):
+    raise ValueError("MODEL_FORMAT must be float or int8, got " + repr(MODEL_FORMAT))
 
-# Load the model that predicts rain
-loaded_predictor = tf.saved_model.load(MODEL_PATH)
-inference_predictor = loaded_predictor.signatures["serving_default"]
+if MODEL_FORMAT == "int8":
+    import numpy as np
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    # Load the int8 model along with the folded standardiser
+    interpreter = Interpreter(model_path=INT8_MODEL_PATH)
+    interpreter.allocate_tensors()
+    input_index = interpreter.get_input_details()[0]["index"]
+    output_details = interpreter.get_output_details()[0]
+    output_index = output_details["index"]
+    with open(INT8_PARAMS_PATH) as f:
+        quantisation = json.load(f)
+    quant_scale = np.array(quantisation["quant_scale"], dtype=np.float32)
+    quant_offset = np.array(quantisation["quant_offset"], dtype=np.float32)
+    # Move the classification threshold into the int8 output domain
+    output_scale, output_zero_point = output_details["quantization"]
+    threshold_q = int(np.ceil(CLASSIFICATION_THRESHOLD / output_scale + output_zero_point))
+else:
+    import tensorflow as tf
+    # Load the model that standardises readings
+    loaded_standardiser = tf.saved_model.load(STANDARDISER_PATH)
+    inference_standardiser = loaded_standardiser.signatures["serving_default"]
+
+    # Load the model that predicts rain
+    loaded_predictor = tf.saved_model.load(MODEL_PATH)
+    inference_predictor = loaded_predictor.signatures["serving_default"]
 
 client = greengrasssdk.client('iot-data')
+# The Shadow is fetched again every 10s, like the loop below, unless the
+#  documents subscription keeps the cache current
+shadow = ShadowProxy(client, flush_interval=10, max_age=10)
+shadow.start()
 
 def parse_shadow(thing_shadow):
     try:
@@ -41,29 +78,49 @@ def parse_shadow(thing_shadow):
         logging.error("Failed to parse thing_shadow: " + repr(e))
     return [readings] # Note predictor expects shape (observations X num_features)
 
-shadow_update = {}
-while True:
-    try:
-        # Get readings from local Shadow
-        thing_shadow = client.get_thing_shadow(thingName=THING_NAME)
-        # Put readings in a list in the right order
-        readings = parse_shadow(thing_shadow=json.loads(thing_shadow["payload"]))
-        # Standardise readings to create model features
-        feature_tensor = inference_standardiser(tf.constant(readings))['x_prime']
-        logging.info(feature_tensor)
-        # Perform prediction
-        raw_prediction = inference_predictor(feature_tensor)['y'].numpy()
-        # Evaluate prediction
-        prediction = (raw_prediction >= CLASSIFICATION_THRESHOLD).astype(int).tolist()[0][0]
-        # Publish result to the local shadow
-        shadow_update["state"] = {"reported" : { "rain_prediction" : prediction } }
-    except Exception as e:
-        logging.error("Failed to do prediction: " + repr(e))
-        
-    client.update_thing_shadow(thingName=THING_NAME, payload=json.dumps(shadow_update))
-    time.sleep(10) # Repeat every 10s
+def predict_float(readings):
+    # Standardise readings to create model features
+    feature_tensor = inference_standardiser(tf.constant(readings))['x_prime']
+    logging.info(feature_tensor)
+    # Perform prediction
+    raw_prediction = inference_predictor(feature_tensor)['y'].numpy()
+    # Evaluate prediction
+    return (raw_prediction >= CLASSIFICATION_THRESHOLD).astype(int).tolist()[0][0]
+
+def predict_int8(readings):
+    # Standardise and quantise readings in one step
+    features = np.round(np.array(readings, dtype=np.float32) * quant_scale + quant_offset)
+    interpreter.set_tensor(input_index, np.clip(features, -128, 127).astype(np.int8))
+    # Perform prediction
+    interpreter.invoke()
+    raw_prediction = int(interpreter.get_tensor(output_index)[0][0])
+    # Evaluate prediction, the threshold is already in the int8 domain
+    return int(raw_prediction >= threshold_q)
 
-# The function handler here will not be called. Our Lambda function
-#  should be long lived and stay in the infinite loop above.
+predict = predict_int8 if MODEL_FORMAT == "int8" else predict_float
+
+def run_inference():
+    while True:
+        try:
+            # Get readings from local Shadow
+            thing_shadow = shadow.get(THING_NAME)
+            # Put readings in a list in the right order
+            readings = parse_shadow(thing_shadow=thing_shadow)
+            prediction = predict(readings)
+            # Publish result to the local shadow, written on the next flush
+            shadow.update(THING_NAME, reported={ "rain_prediction" : prediction })
+        except Exception as e:
+            logging.error("Failed to do prediction: " + repr(e))
+        time.sleep(10) # Repeat every 10s
+
+# Our Lambda function should be long lived and keep running the inference
+#  loop in its own thread, so the function handler is free to take messages
+threading.Thread(target=run_inference).start()
+
+# Subscribing this lambda to $aws/things/<THING_NAME>/shadow/update/documents
+#  keeps the cached Shadow current between reads
 def function_handler(event, context):
-    pass
\ No newline at end of file
+    try:
+        shadow.apply_documents(context.client_context.custom['subject'], event)
+    except Exception as e:
+        logging.error("Failed to apply shadow documents: " + repr(e))
@@ -0,0 +1,213 @@
+"""
+Created on Mon Oct 19 17:45:00 2026
+
+@author: AnHosu
+
+This is a publish scheduler for the AWS IoT Python SDK. It accompanies the
+ demonstrations at:
+ https://github.com/AnHosu/iot_poc/blob/master/pubsub.md
+ https://github.com/AnHosu/iot_poc/blob/master/shadow.md
+Instead of calling the blocking publish of the MQTT client directly, scripts
+ queue messages by class. Control messages are sent before Shadow updates,
+ and Shadow updates before telemetry. Each class is rate limited with a token
+ bucket, and so is the connection as a whole, to stay below the throttling
+ limits of the broker. Under congestion, telemetry is downgraded to QoS 0 and
+ eventually the oldest telemetry is shed, while producers of control and
+ Shadow messages are made to wait for room in the queue.
+Messages are sent with publishAsync, so a QoS 1 message waiting for its PUBACK
+ does not hold up the next one. The number of QoS 1 messages waiting for a
+ PUBACK is capped by max_inflight.
+Do not let publish block inside a subscribe callback of the MQTT client, since
+ the worker publishes through the same client. Pass timeout=0 there instead.
+"""
+import collections
+import threading
+import logging
+import time
+
+CONTROL = "control"
+SHADOW = "shadow"
+TELEMETRY = "telemetry"
+PRIORITIES = [CONTROL, SHADOW, TELEMETRY]
+
+# (messages per second, burst) for each class and for the whole connection.
+#  AWS IoT Core allows 100 publishes per second per connection.
+DEFAULT_RATES = {CONTROL : (20, 20),
+                 SHADOW : (10, 10),
+                 TELEMETRY : (5, 20)}
+DEFAULT_CONNECTION_RATE = (100, 100)
+# Seconds control and Shadow producers wait for room in a full queue
+DEFAULT_TIMEOUT = 1
+# Seconds to wait for a PUBACK, like configureMQTTOperationTimeout in the scripts
+ACK_TIMEOUT = 5
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        '''
+        Seconds until a token is available, 0 if there is one now
+        '''
+        self._refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+class PublishScheduler:
+    def __init__(self, client, rates=None, connection_rate=DEFAULT_CONNECTION_RATE,
+                 queue_size=100, congestion=0.5, max_inflight=20):
+        '''
+        client is a connected AWSIoTMQTTClient. Telemetry is sent with QoS 0
+         while its queue is more than the congestion fraction full
+        '''
+        self.client = client
+        rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.buckets = {kind : TokenBucket(*rates[kind]) for kind in PRIORITIES}
+        self.connection = TokenBucket(*connection_rate)
+        self.queue_size = queue_size
+        self.congestion = congestion
+        self.queues = {kind : collections.deque() for kind in PRIORITIES}
+        self.shed = 0
+        self.downgraded = 0
+        self.max_inflight = max_inflight
+        # Packet ids of QoS 1 messages waiting for a PUBACK, and the time sent
+        self._inflight = {}
+        # PUBACKs that arrived before publishAsync returned the packet id
+        self._early_acks = set()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def publish(self, topic, payload, qos, kind=TELEMETRY, timeout=DEFAULT_TIMEOUT):
+        '''
+        Queues a message for publishing. Returns False if the message was
+         not queued, because the queue stayed full for timeout seconds.
+         timeout=None waits for as long as it takes
+        '''
+        if kind not in self.queues:
+            raise ValueError("Unknown message class " + repr(kind))
+        queue = self.queues[kind]
+        with self._condition:
+            if kind == TELEMETRY:
+                if len(queue) >= self.queue_size:
+                    # Shed the oldest reading, the newest one is worth more
+                    queue.popleft()
+                    self.shed += 1
+                    logging.warning("Telemetry queue is full, shed the oldest message ("
+                                    + str(self.shed) + " shed so far)")
+            elif not self._condition.wait_for(lambda: len(queue) < self.queue_size, timeout):
+                logging.error("Publish queue for " + kind + " is full, dropping message to " + topic)
+                return False
+            queue.append((topic, payload, qos))
+            self._condition.notify_all()
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        '''
+        Sends what is left in the queues, within the rate limits, for up to
+         timeout seconds. Messages that are still queued after that are dropped
+        '''
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is None:
+            return
+        self._thread.join(timeout)
+        with self._condition:
+            dropped = sum(len(queue) for queue in self.queues.values())
+            if dropped:
+                logging.warning("Publish scheduler stopped, dropping " + str(dropped) + " queued messages")
+            for queue in self.queues.values():
+                queue.clear()
+            self._condition.notify_all()
+        self._thread.join()
+        self._thread = None
+        logging.info("Publish scheduler stopped, " + str(self.shed) + " telemetry messages shed and "
+                     + str(self.downgraded) + " downgraded to QoS 0")
+
+    def _next(self):
+        '''
+        Returns the next message to send, or None along with the number of
+         seconds to wait before trying again. None means wait for a message
+        '''
+        self._expire_inflight()
+        wait = None
+        for kind in PRIORITIES:
+            queue = self.queues[kind]
+            if not queue:
+                continue
+            delay = max(self.buckets[kind].delay(), self.connection.delay())
+            if delay == 0:
+                topic, payload, qos = queue[0]
+                # Decide on the downgrade now, from the congestion right now
+                if kind == TELEMETRY and qos > 0 and len(queue) >= self.congestion * self.queue_size:
+                    qos = 0
+                    self.downgraded += 1
+                if qos > 0 and len(self._inflight) >= self.max_inflight:
+                    # Wait for a PUBACK, but let QoS 0 messages further down pass
+                    wait = ACK_TIMEOUT if wait is None else min(wait, ACK_TIMEOUT)
+                    continue
+                self.buckets[kind].take()
+                self.connection.take()
+                queue.popleft()
+                return (topic, payload, qos), None
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _expire_inflight(self):
+        now = time.monotonic()
+        for packet_id, sent in list(self._inflight.items()):
+            if now - sent > ACK_TIMEOUT:
+                del self._inflight[packet_id]
+                logging.warning("No PUBACK for packet " + str(packet_id) + " within "
+                                + str(ACK_TIMEOUT) + "s")
+
+    def _on_ack(self, packet_id):
+        with self._condition:
+            if self._inflight.pop(packet_id, None) is None:
+                self._early_acks.add(packet_id)
+            self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                message, wait = self._next()
+                if message is None:
+                    # Keep sending until the queues are empty when stopping
+                    if not self._running and not any(self.queues.values()):
+                        return
+                    self._condition.wait(wait)
+                    continue
+                # There is room in the queue for producers that are waiting
+                self._condition.notify_all()
+            topic, payload, qos = message
+            try:
+                if qos > 0:
+                    packet_id = self.client.publishAsync(topic, payload, qos, ackCallback=self._on_ack)
+                    with self._condition:
+                        if packet_id in self._early_acks:
+                            self._early_acks.discard(packet_id)
+                        else:
+                            self._inflight[packet_id] = time.monotonic()
+                else:
+                    self.client.publishAsync(topic, payload, qos)
+            except Exception as e:
+                logging.error("Failed to publish to " + topic + ": " + repr(e))
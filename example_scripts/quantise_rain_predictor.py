@@ -0,0 +1,247 @@
+"""
+Created on Mon Oct 19 09:12:00 2026
+
+@author: AnHosu
+
+This script converts the standardiser and rain_predictor SavedModels into
+ an int8 TFLite model for low-power Greengrass cores. It accompanies the
+ demonstration at:
+ https://github.com/AnHosu/iot_poc/blob/master/greengrass_ml.md
+It is meant to run on a development machine with Tensorflow2 installed, not
+ on the Gateway Device. Calibration uses logged readings from a CSV file with
+ the columns pressure, temperature, and humidity. If the file also has a rain
+ column (0 or 1), the report includes accuracy against those labels. A random
+ held-out part of the readings is kept out of calibration and used for the
+ report, so the int8 model is not judged on the data it was calibrated on.
+"""
+import tensorflow as tf
+import numpy as np
+import argparse
+import json
+import time
+import csv
+import os
+
+CLASSIFICATION_THRESHOLD = 0.5
+FEATURES = ["pressure", "temperature", "humidity"]
+
+# Read in command-line parameters
+parser = argparse.ArgumentParser()
+parser.add_argument("-s", "--standardiser", action="store", dest="standardiserPath", default="../ml_resources/standardiser", help="Unzipped standardiser SavedModel")
+parser.add_argument("-m", "--model", action="store", dest="modelPath", default="../ml_resources/rain_predictor", help="Unzipped rain_predictor SavedModel")
+parser.add_argument("-d", "--readings", action="store", required=True, dest="readingsPath", help="CSV file of logged readings for calibration")
+parser.add_argument("-o", "--output", action="store", dest="outputPath", default="./rain_predictor_int8", help="Folder for the int8 model")
+parser.add_argument("-f", "--holdout", action="store", type=float, dest="holdout", default=0.2, help="Fraction of readings held out of calibration for the report")
+parser.add_argument("-n", "--repeats", action="store", type=int, dest="repeats", default=200, help="Number of timed inferences per model")
+
+args = parser.parse_args()
+if not 0 < args.holdout < 1:
+    parser.error("The holdout fraction must be between 0 and 1.")
+
+def load_readings(path):
+    '''
+    Reads logged readings into an array of shape (observations X num_features)
+     along with rain labels, if there are any
+    '''
+    readings = []
+    labels = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                reading = [float(row[feature]) for feature in FEATURES]
+                label = None
+                if row.get("rain") not in (None, ""):
+                    label = int(float(row["rain"]))
+            except (KeyError, TypeError, ValueError):
+                # Failed sensor reads are logged with empty values, skip
+                #  those and any malformed labels
+                continue
+            readings.append(reading)
+            if label is not None:
+                labels.append(label)
+    if not readings:
+        raise ValueError("No usable readings in " + path)
+    if len(labels) != len(readings):
+        labels = None
+    return np.array(readings, dtype=np.float32), labels
+
+def split_holdout(readings, labels, fraction):
+    '''
+    Splits readings at random into a calibration part and a held-out part
+    '''
+    order = np.random.default_rng(seed=0).permutation(len(readings))
+    num_holdout = int(round(fraction * len(readings)))
+    if num_holdout < 1 or num_holdout >= len(readings):
+        raise ValueError("Too few readings to hold out a fraction of " + str(fraction))
+    holdout, calibration = order[:num_holdout], order[num_holdout:]
+    holdout_labels = None if labels is None else [labels[i] for i in holdout]
+    return readings[calibration], readings[holdout], holdout_labels
+
+def fold_standardiser(inference_standardiser, readings):
+    '''
+    The standardiser is an affine transformation per feature. We probe it
+     to get the scale and offset, so that the integer inference path can
+     standardise and quantise readings in a single step without Tensorflow
+    '''
+    num_features = len(FEATURES)
+    zeros = np.zeros((1, num_features), dtype=np.float32)
+    ones = np.ones((1, num_features), dtype=np.float32)
+    offset = inference_standardiser(tf.constant(zeros))['x_prime'].numpy()[0]
+    scale = inference_standardiser(tf.constant(ones))['x_prime'].numpy()[0] - offset
+    # Verify the folded transformation on the calibration data
+    expected = inference_standardiser(tf.constant(readings))['x_prime'].numpy()
+    error = np.max(np.abs(readings * scale + offset - expected))
+    if error > 1e-3 * max(1.0, np.max(np.abs(expected))):
+        raise ValueError("Standardiser is not affine, max deviation " + str(error))
+    return scale.astype(np.float32), offset.astype(np.float32)
+
+def saved_model_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+def float_weight_bytes(path):
+    '''
+    Bytes of the weights stored in a SavedModel, read from its checkpoint so
+     it works for Keras models as well as plain tf.Modules
+    '''
+    reader = tf.train.load_checkpoint(os.path.join(path, "variables", "variables"))
+    total = 0
+    for name, dtype in reader.get_variable_to_dtype_map().items():
+        # Skip the object graph and any optimizer state saved with the model
+        if name.startswith("_CHECKPOINTABLE_OBJECT_GRAPH") or "OPTIMIZER_SLOT" in name \
+                or name.startswith("optimizer/"):
+            continue
+        total += reader.get_tensor(name).nbytes
+    return total
+
+def int8_weight_bytes(interpreter):
+    '''
+    Bytes of the constant tensors in a TFLite model, i.e. weights and biases.
+     Activations are the tensors produced by an op or fed in as model inputs.
+     TFLite has no public API for the ops of a model, so this relies on
+     Interpreter._get_ops_details, available from Tensorflow 2.5. Returns
+     None on versions without it
+    '''
+    if not hasattr(interpreter, "_get_ops_details"):
+        return None
+    ops = interpreter._get_ops_details()
+    activations = set(t["index"] for t in interpreter.get_input_details())
+    for op in ops:
+        activations.update(op["outputs"])
+    constants = set()
+    for op in ops:
+        constants.update(i for i in op["inputs"] if i >= 0 and i not in activations)
+    return sum(int(np.prod(t["shape"])) * np.dtype(t["dtype"]).itemsize
+               for t in interpreter.get_tensor_details() if t["index"] in constants)
+
+def time_inference(infer, readings, repeats):
+    '''
+    Mean latency in ms of predicting a single observation, which is how the
+     inference Lambda uses the model
+    '''
+    infer(readings[:1]) # Warm up
+    start = time.perf_counter()
+    for n in range(repeats):
+        infer(readings[n % len(readings)][np.newaxis, :])
+    return (time.perf_counter() - start) * 1000.0 / repeats
+
+# Load the float pipeline exactly as the inference Lambda does
+loaded_standardiser = tf.saved_model.load(args.standardiserPath)
+inference_standardiser = loaded_standardiser.signatures["serving_default"]
+loaded_predictor = tf.saved_model.load(args.modelPath)
+inference_predictor = loaded_predictor.signatures["serving_default"]
+
+readings, labels = load_readings(args.readingsPath)
+calibration, holdout, holdout_labels = split_holdout(readings, labels, args.holdout)
+scale, offset = fold_standardiser(inference_standardiser, calibration)
+features = calibration * scale + offset
+
+# Quantising raw readings directly would put pressure (~1000 hPa) and
+#  humidity (0-100 %) on a single int8 scale and wash out the pressure
+#  signal, so the int8 model takes standardised features as input
+feature_spec = tf.TensorSpec(shape=[1, len(FEATURES)], dtype=tf.float32)
+predict = tf.function(lambda x: inference_predictor(x)['y'], input_signature=[feature_spec])
+
+def representative_dataset():
+    for feature in features:
+        yield [feature[np.newaxis, :]]
+
+converter = tf.lite.TFLiteConverter.from_concrete_functions([predict.get_concrete_function()], loaded_predictor)
+converter.optimizations = [tf.lite.Optimize.DEFAULT]
+converter.representative_dataset = representative_dataset
+converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+converter.inference_input_type = tf.int8
+converter.inference_output_type = tf.int8
+tflite_model = converter.convert()
+
+interpreter = tf.lite.Interpreter(model_content=tflite_model)
+interpreter.allocate_tensors()
+input_details = interpreter.get_input_details()[0]
+output_details = interpreter.get_output_details()[0]
+input_scale, input_zero_point = input_details["quantization"]
+output_scale, output_zero_point = output_details["quantization"]
+
+# Fold standardisation and input quantisation into one affine step per
+#  feature, q = round(x * quant_scale + quant_offset), and move the
+#  classification threshold into the int8 output domain
+quant_scale = scale / input_scale
+quant_offset = offset / input_scale + input_zero_point
+threshold_q = int(np.ceil(CLASSIFICATION_THRESHOLD / output_scale + output_zero_point))
+
+# Save the int8 model along with the parameters the inference Lambda needs
+if not os.path.exists(args.outputPath):
+    os.makedirs(args.outputPath)
+with open(os.path.join(args.outputPath, "rain_predictor_int8.tflite"), "wb") as f:
+    f.write(tflite_model)
+quantisation = {}
+quantisation["features"] = FEATURES
+quantisation["quant_scale"] = quant_scale.tolist()
+quantisation["quant_offset"] = quant_offset.tolist()
+with open(os.path.join(args.outputPath, "quantisation.json"), "w") as f:
+    json.dump(quantisation, f, indent=4)
+
+def infer_float(batch):
+    feature_tensor = inference_standardiser(tf.constant(batch))['x_prime']
+    return inference_predictor(feature_tensor)['y'].numpy()
+
+def infer_int8(batch):
+    q = np.clip(np.round(batch * quant_scale + quant_offset), -128, 127).astype(np.int8)
+    interpreter.set_tensor(input_details["index"], q)
+    interpreter.invoke()
+    return interpreter.get_tensor(output_details["index"]).copy()
+
+# Evaluate both models on the held-out readings
+float_pred = []
+int8_pred = []
+for reading in holdout:
+    batch = reading[np.newaxis, :]
+    float_pred.append(int(infer_float(batch)[0][0] >= CLASSIFICATION_THRESHOLD))
+    int8_pred.append(int(int(infer_int8(batch)[0][0]) >= threshold_q))
+float_pred = np.array(float_pred)
+int8_pred = np.array(int8_pred)
+
+report = {}
+report["calibration_observations"] = len(calibration)
+report["holdout_observations"] = len(holdout)
+report["classification_threshold"] = CLASSIFICATION_THRESHOLD
+report["agreement"] = float(np.mean(float_pred == int8_pred))
+if holdout_labels is not None:
+    report["float_accuracy"] = float(np.mean(float_pred == np.array(holdout_labels)))
+    report["int8_accuracy"] = float(np.mean(int8_pred == np.array(holdout_labels)))
+report["float_latency_ms"] = time_inference(infer_float, holdout, args.repeats)
+report["int8_latency_ms"] = time_inference(infer_int8, holdout, args.repeats)
+report["float_model_bytes"] = saved_model_bytes(args.standardiserPath) + saved_model_bytes(args.modelPath)
+report["int8_model_bytes"] = len(tflite_model)
+# Weights only on both sides, the folded standardiser is two small vectors
+report["float_weight_bytes"] = float_weight_bytes(args.standardiserPath) + float_weight_bytes(args.modelPath)
+int8_weights = int8_weight_bytes(interpreter)
+if int8_weights is not None:
+    report["int8_weight_bytes"] = int8_weights + quant_scale.nbytes + quant_offset.nbytes
+
+with open(os.path.join(args.outputPath, "report.json"), "w") as f:
+    json.dump(report, f, indent=4)
+
+print(json.dumps(report, indent=4))
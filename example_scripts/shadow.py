@@ -9,6 +9,7 @@ This simple example of subscribing to topics from AWS IoT with is to be used
 """
 import time
 from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from publish_scheduler import PublishScheduler, SHADOW
 import logging
 import argparse
 import json
@@ -66,6 +67,10 @@ myAWSIoTMQTTClient.configureMQTTOperationTimeout(5)  # 5 sec
 myAWSIoTMQTTClient.connect()
 time.sleep(2)
 
+# Shadow updates are queued ahead of any telemetry on the connection
+scheduler = PublishScheduler(myAWSIoTMQTTClient)
+scheduler.start()
+
 # Specify what to do, when we receive an update
 def callback_update_accepted(client, userdata, message):
     print("Got an update, on the topic:")
@@ -93,5 +98,5 @@ while True:
     message["state"] = { "reported" : {"temperature" : temperature } }
     messageJson = json.dumps(message)
     # Update the shadow
-    myAWSIoTMQTTClient.publish(topic_update, messageJson, 1)
+    scheduler.publish(topic_update, messageJson, 1, kind=SHADOW)
     time.sleep(15)
@@ -0,0 +1,267 @@
+"""
+Created on Mon Oct 19 14:20:00 2026
+
+@author: AnHosu
+
+This is a local proxy for the Greengrass Shadow service. It accompanies the
+ demonstration at:
+ https://github.com/AnHosu/iot_poc/blob/master/greengrass_ml.md
+Include it in the deployment package of a lambda function, next to the
+ Greengrass SDK. The proxy caches the latest document and version per thing
+ so reads are served from memory. Partial updates are merged and written
+ once per flush interval, and every write carries the cached version so
+ updates are never based on a stale document, unless versioned=False.
+The cache is kept current by passing messages from the
+ $aws/things/<thing name>/shadow/update/documents topic to apply_documents.
+ While those messages arrive, cached documents are trusted for
+ documents_max_age seconds. Without them, the proxy falls back to max_age,
+ which should be about as short as the time between reads.
+A proxy that only writes, and never sees documents messages, can be created
+ with versioned=False. Its writes are then plain partial updates, which the
+ Shadow service merges, instead of failing on every change from other writers.
+"""
+from greengrasssdk.IoTDataPlane import ShadowError
+import threading
+import logging
+import copy
+import json
+import time
+import re
+
+VERSION_CONFLICT = 409
+NOT_FOUND = 404
+
+def error_code(e):
+    '''
+    Parses the error code from a ShadowError raised by the Greengrass SDK
+    '''
+    match = re.search(r"error code (\d+)", str(e))
+    return int(match.group(1)) if match else None
+
+def merge_state(base, update):
+    '''
+    Merges a partial shadow state into base the same way the Shadow service
+     does. Nested dicts are merged and a value of None deletes the key
+    '''
+    for key, value in update.items():
+        if value is None:
+            base.pop(key, None)
+        elif isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_state(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+def merge_pending(base, update):
+    '''
+    Merges pending updates while keeping None, so deletes are still written
+    '''
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(base.get(key), dict):
+            merge_pending(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+def changed_state(current, update):
+    '''
+    Returns the part of a partial update that differs from the current state
+    '''
+    changes = {}
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(current.get(key), dict):
+            nested = changed_state(current[key], value)
+            if nested:
+                changes[key] = nested
+        elif value is None:
+            if key in current:
+                changes[key] = None
+        elif current.get(key) != value:
+            changes[key] = value
+    return changes
+
+class ShadowProxy:
+    def __init__(self, client, flush_interval=10, max_age=10, documents_max_age=300,
+                 max_retries=3, versioned=True):
+        '''
+        client is a Greengrass SDK iot-data client. Cached documents older
+         than max_age seconds are fetched again on read, or documents_max_age
+         seconds while documents messages keep arriving
+        '''
+        self.client = client
+        self.flush_interval = flush_interval
+        self.max_age = max_age
+        self.documents_max_age = documents_max_age
+        self.max_retries = max_retries
+        self.versioned = versioned
+        self._documents = {}
+        self._versions = {}
+        self._fetched = {}
+        self._documents_seen = {}
+        self._pending = {}
+        # Updates taken from _pending by a flush that is still writing them
+        self._inflight = {}
+        # _lock guards the cache and is never held during Shadow calls.
+        #  _flush_lock makes sure only one flush writes at a time.
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+
+    def get(self, thing_name):
+        '''
+        Returns the latest shadow document, including updates not yet written
+        '''
+        if self._is_stale(thing_name):
+            self._fetch(thing_name)
+        with self._lock:
+            document = copy.deepcopy(self._documents[thing_name])
+            state = document.setdefault("state", {})
+            merge_state(state, self._inflight.get(thing_name, {}))
+            merge_state(state, self._pending.get(thing_name, {}))
+        return document
+
+    def update(self, thing_name, reported=None, desired=None):
+        '''
+        Queues a partial update. It is merged with other pending updates
+         for the thing and written on the next flush
+        '''
+        state = {}
+        if reported is not None:
+            state["reported"] = reported
+        if desired is not None:
+            state["desired"] = desired
+        with self._lock:
+            merge_pending(self._pending.setdefault(thing_name, {}), state)
+
+    def apply_documents(self, topic, event):
+        '''
+        Refreshes the cache from a message on the
+         $aws/things/<thing name>/shadow/update/documents topic
+        '''
+        thing_name = topic.split("/")[2]
+        current = event.get("current", {})
+        if "version" not in current:
+            return
+        with self._lock:
+            self._documents_seen[thing_name] = time.time()
+            self._store(thing_name, current)
+
+    def flush(self):
+        '''
+        Writes one coalesced update per thing. Updates that fail are kept
+         and retried on the next flush
+        '''
+        with self._flush_lock:
+            with self._lock:
+                self._inflight = self._pending
+                self._pending = {}
+            for thing_name, state in list(self._inflight.items()):
+                try:
+                    self._write(thing_name, state)
+                    with self._lock:
+                        del self._inflight[thing_name]
+                except Exception as e:
+                    logging.error("Failed to update shadow of " + thing_name + ": " + repr(e))
+                    with self._lock:
+                        del self._inflight[thing_name]
+                        # Newer updates queued since take precedence
+                        self._pending[thing_name] = merge_pending(state, self._pending.get(thing_name, {}))
+
+    def start(self):
+        '''
+        Flushes in a background thread every flush_interval seconds
+        '''
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def _is_stale(self, thing_name):
+        now = time.time()
+        with self._lock:
+            fetched = self._fetched.get(thing_name)
+            seen = self._documents_seen.get(thing_name)
+        # Only trust the cache for long while documents messages keep it current
+        max_age = self.max_age
+        if seen is not None and now - seen < self.documents_max_age:
+            max_age = self.documents_max_age
+        return fetched is None or now - fetched > max_age
+
+    def _fetch(self, thing_name):
+        try:
+            thing_shadow = self.client.get_thing_shadow(thingName=thing_name)
+            document = json.loads(thing_shadow["payload"])
+        except ShadowError as e:
+            if error_code(e) != NOT_FOUND:
+                raise
+            # The shadow is created by the first update
+            document = {"state": {}}
+        with self._lock:
+            self._store(thing_name, document)
+
+    def _store(self, thing_name, document):
+        '''
+        Caches a document unless the cache already holds a newer version.
+         Must be called with _lock held
+        '''
+        version = document.get("version")
+        cached = self._versions.get(thing_name)
+        if version is not None and cached is not None and version < cached:
+            return
+        self._documents[thing_name] = copy.deepcopy(document)
+        self._versions[thing_name] = version
+        self._fetched[thing_name] = time.time()
+
+    def _changes(self, thing_name, pending):
+        '''
+        Returns the changes to write along with the version they are based on
+        '''
+        with self._lock:
+            current = self._documents[thing_name].get("state", {})
+            return changed_state(current, pending), self._versions.get(thing_name)
+
+    def _write(self, thing_name, pending):
+        if thing_name not in self._documents:
+            if self.versioned:
+                self._fetch(thing_name)
+            else:
+                # Blind writes need no version, so start from an empty cache
+                #  that only tracks what this proxy has written
+                with self._lock:
+                    self._documents[thing_name] = {"state": {}}
+                    self._versions[thing_name] = None
+                    self._fetched[thing_name] = time.time()
+        for _ in range(self.max_retries):
+            # Values the shadow already holds do not need to be written again.
+            #  A stale cache could hide a change, so check again before skipping
+            state, version = self._changes(thing_name, pending)
+            if not state and self._is_stale(thing_name):
+                self._fetch(thing_name)
+                state, version = self._changes(thing_name, pending)
+            if not state:
+                return
+            message = {"state": state}
+            if self.versioned and version is not None:
+                message["version"] = version
+            try:
+                response = self.client.update_thing_shadow(thingName=thing_name, payload=json.dumps(message))
+            except ShadowError as e:
+                if error_code(e) != VERSION_CONFLICT:
+                    raise
+                # Someone else updated the shadow, get the new version and retry
+                self._fetch(thing_name)
+                continue
+            accepted = json.loads(response["payload"])
+            with self._lock:
+                # Only apply our write if no newer document arrived meanwhile
+                if self._versions.get(thing_name) == version:
+                    document = self._documents[thing_name]
+                    merge_state(document.setdefault("state", {}), state)
+                    document["version"] = accepted.get("version", version)
+                    self._versions[thing_name] = document["version"]
+            return
+        raise RuntimeError("Version conflict persisted after " + str(self.max_retries) + " retries")
@@ -9,6 +9,7 @@ This simple example of subscribing to topics from AWS IoT with is to be used
 """
 import time
 from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from publish_scheduler import PublishScheduler, CONTROL, TELEMETRY
 import logging
 import argparse
 import json
@@ -76,6 +77,13 @@ def callback_function(client, userdata, message):
         else:
             pubtopic = None
             variable = None
+    # Acknowledge the action. Control messages are sent ahead of readings,
+    #  and timeout=0 makes sure the callback never blocks the client
+    ack = {}
+    ack['action'] = payload.get("action")
+    ack['status'] = "accepted" if variable is not None else "rejected"
+    ack['timestamp_utc'] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    scheduler.publish(root_pubtopic + "ack", json.dumps(ack), 1, kind=CONTROL, timeout=0)
 
 # Init AWSIoTMQTTClient
 myAWSIoTMQTTClient = AWSIoTMQTTClient(clientId)
@@ -89,8 +97,12 @@ myAWSIoTMQTTClient.configureDrainingFrequency(2)  # Draining: 2 Hz
 myAWSIoTMQTTClient.configureConnectDisconnectTimeout(10)  # 10 sec
 myAWSIoTMQTTClient.configureMQTTOperationTimeout(5)  # 5 sec
 
+# Publish through the scheduler, so readings cannot crowd out acknowledgements
+scheduler = PublishScheduler(myAWSIoTMQTTClient)
+
 # Connect and subscribe to AWS IoT
 myAWSIoTMQTTClient.connect()
+scheduler.start()
 myAWSIoTMQTTClient.subscribe(subtopic, 1, callback_function)
 time.sleep(2)
 
@@ -120,8 +132,8 @@ while True:
             message['status'] = "fail"
         message['timestamp_utc'] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%fZ")
         messageJson = json.dumps(message)
-        # This is the actual publishing to AWS
-        myAWSIoTMQTTClient.publish(pubtopic, messageJson, 1)
-        print('Published topic %s: %s\n' % (pubtopic, messageJson))
+        # This queues the message for publishing to AWS
+        scheduler.publish(pubtopic, messageJson, 1, kind=TELEMETRY)
+        print('Queued topic %s: %s\n' % (pubtopic, messageJson))
     loopCount += 1
     time.sleep(5)